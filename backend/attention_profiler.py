@@ -6,11 +6,62 @@ Reveals that different heads learn different linguistic roles.
 """
 
 import numpy as np
-import pickle
 import os
+import hashlib
+import inspect
+import threading
 from typing import List, Dict, Tuple
+from scipy.special import xlogy
 from sklearn.manifold import TSNE
 from sklearn.cluster import KMeans
+from sklearn.metrics import adjusted_rand_score
+from sklearn.decomposition import PCA
+from joblib import Parallel, delayed
+
+# scikit-learn 1.5 renamed TSNE's n_iter to max_iter (and needs Python 3.9+)
+_TSNE_ITER_PARAM = 'max_iter' if 'max_iter' in inspect.signature(TSNE).parameters else 'n_iter'
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    # nogil: compute_profiles runs sentences on a thread pool
+    @njit(cache=True, fastmath=True, nogil=True)
+    def _feature_kernel(attention):
+        """
+        Fused single-pass version of the 5 features for a (m, seq, seq) stack.
+        Short sentences make NumPy's per-op dispatch dominate; this avoids it.
+        """
+        m, n = attention.shape[0], attention.shape[1]
+        out = np.empty((m, 5))
+        for k in range(m):
+            diag = 0.0
+            fwd = 0.0
+            bwd = 0.0
+            ent = 0.0
+            pos = 0.0
+            for i in range(n):
+                for j in range(n):
+                    a = attention[k, i, j]
+                    if i == j:
+                        diag += a
+                    elif j > i:
+                        fwd += a
+                    else:
+                        bwd += a
+                    if a > 0:
+                        ent -= a * np.log(a)
+                    pos += abs(i - j) * a
+            out[k, 0] = diag / n
+            out[k, 1] = fwd / (n * n)
+            out[k, 2] = bwd / (n * n)
+            out[k, 3] = ent / n
+            out[k, 4] = pos / (n * n)
+        return out
 
 class AttentionHeadProfiler:
     """
@@ -20,7 +71,8 @@ class AttentionHeadProfiler:
     
     def __init__(self, transformer_engine):
         self.engine = transformer_engine
-        self.cache_file = "attention_profiles.pkl"
+        self.cache_file = None  # Keyed by sentence content, see _profile_cache_path
+        self.attention_cache_file = "attention_cache.npz"
         
         # 50 canonical sentences covering diverse linguistic patterns
         self.test_sentences = [
@@ -108,7 +160,8 @@ class AttentionHeadProfiler:
         self.profiles = None
         self.clusters = None
         self.profiles_matrix = None  # Store original features for explanations
-        self.stability_score = None
+        self.stability_score = None  # Assigned last: non-None means all results are ready
+        self._compute_lock = threading.Lock()
         self.cluster_labels = {
             0: "Syntax Trackers",
             1: "Semantic Linkers",
@@ -126,57 +179,89 @@ class AttentionHeadProfiler:
             "Distance-weighted attention"
         ]
         
+        # (layer, head) for each of the 144 head indices, in head_idx order
+        self._layers_arr = np.repeat(np.arange(12), 12)
+        self._heads_arr = np.tile(np.arange(12), 12)
+        self._names = [f"L{l}H{h}" for l, h in zip(self._layers_arr, self._heads_arr)]
+        
+        # Per-length distance matrix and triangle mask, shared across heads
+        self._position_cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        
+        # sentence -> (tokens, attention (layers, heads, seq, seq) in FP16)
+        self._sentence_cache: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        # sentence -> feature grid (12 layers, 12 heads, 5 features)
+        self._feature_cache: Dict[str, np.ndarray] = {}
+        self._sentence_cache_loaded = False
+        
+    def _profile_cache_path(self) -> str:
+        """Profile cache file keyed by a hash of the test sentences"""
+        key = hashlib.blake2b('\n'.join(self.test_sentences).encode()).hexdigest()[:16]
+        return f"attention_profiles_{key}.npz"
+        
     def compute_profiles(self):
         """Pre-compute attention patterns for all 144 heads"""
+        # Handlers run on a threadpool: concurrent first calls wait for one computation
+        with self._compute_lock:
+            if self.stability_score is None:
+                self._compute_profiles()
+    
+    def _compute_profiles(self):
+        self.cache_file = self._profile_cache_path()
         if os.path.exists(self.cache_file):
             print("Loading cached attention profiles...")
-            with open(self.cache_file, 'rb') as f:
-                data = pickle.load(f)
+            with np.load(self.cache_file) as data:
                 self.profiles = data['profiles']
                 self.clusters = data['clusters']
-                self.profiles_matrix = data.get('profiles_matrix')
-                self.stability_score = data.get('stability_score', 0.0)
+                self.profiles_matrix = data['profiles_matrix'] if 'profiles_matrix' in data.files else None
+                self.stability_score = float(data['stability'][0]) if 'stability' in data.files else 0.0
                 return
         
         print("Computing attention head profiles (this may take a few minutes)...")
         
-        # Collect features for each head across all sentences
-        # Shape: (144 heads, features)
-        all_head_features = []
+        # Collect features for each head across all sentences.
+        # Only sentences missing from the per-sentence cache need a forward pass;
+        # batched passes yield all 144 heads for every sentence at once.
+        if not self._sentence_cache_loaded:
+            self._load_sentence_cache()
+        missing = [s for s in dict.fromkeys(self.test_sentences) if s not in self._feature_cache]
         
-        for head_idx in range(144):
-            layer = head_idx // 12
-            head = head_idx % 12
+        if missing:
+            batch = self.engine.get_attention_batch(missing)
             
-            head_features = []
+            # Sentences are independent and both the nogil numba kernel and NumPy
+            # release the GIL, so threads scale.
+            # Pad positions are dropped before extraction.
+            per_sentence = Parallel(n_jobs=-1, prefer='threads')(
+                delayed(self._sentence_features)(sentence, attention[:, :, :seq_len, :seq_len])
+                for sentence, seq_len, attention in zip(missing, batch['lengths'], batch['attention'])
+            )
             
-            for sentence in self.test_sentences:
-                try:
-                    data = self.engine.get_attention_data(sentence)
-                    attention = data['attention']  # (12 layers, 12 heads, seq, seq)
-                    
-                    if layer < attention.shape[0] and head < attention.shape[1]:
-                        head_attention = attention[layer, head]
-                        features = self._extract_features(head_attention)
-                        head_features.extend(features)
-                except Exception as e:
-                    print(f"Error processing L{layer}H{head}: {e}")
-                    head_features.extend([0] * 5)  # Fallback
-            
-            all_head_features.append(head_features)
+            for sentence, tokens, seq_len, attention, features in zip(
+                missing, batch['tokens'], batch['lengths'], batch['attention'], per_sentence
+            ):
+                self._sentence_cache[sentence] = (tokens, attention[:, :, :seq_len, :seq_len].astype(np.float16))
+                self._feature_cache[sentence] = features
         
-        # Convert to numpy array
-        profiles_matrix = np.array(all_head_features)
+        # (12 layers, 12 heads, sentences, 5 features) -> (144 heads, sentences * 5 features)
+        # float32 halves the footprint; KMeans and t-SNE consume it without upcasting
+        profiles_matrix = np.stack(
+            [self._feature_cache[s] for s in self.test_sentences], axis=2
+        ).reshape(144, -1).astype(np.float32)
         
         # Cluster heads
         print("Clustering attention heads...")
-        kmeans = KMeans(n_clusters=5, random_state=42, n_init=10)
-        clusters = kmeans.fit_predict(profiles_matrix)
+        clusters = self._cluster(profiles_matrix, random_state=42)
         
         # t-SNE for 3D visualization
         print("Creating 3D projection...")
-        tsne = TSNE(n_components=3, random_state=42, perplexity=30)
-        profiles_3d = tsne.fit_transform(profiles_matrix)
+        # PCA pre-reduction denoises and speeds up t-SNE's pairwise distances
+        n_components = min(50, *profiles_matrix.shape)
+        reduced = PCA(n_components=n_components).fit_transform(profiles_matrix)
+        tsne = TSNE(
+            n_components=3, init='pca', perplexity=30,
+            learning_rate='auto', random_state=42, n_jobs=-1, **{_TSNE_ITER_PARAM: 500}
+        )
+        profiles_3d = tsne.fit_transform(reduced)
         
         self.profiles = profiles_3d
         self.clusters = clusters
@@ -189,108 +274,212 @@ class AttentionHeadProfiler:
         
         # Cache results
         print("Caching results...")
-        with open(self.cache_file, 'wb') as f:
-            pickle.dump({
-                'profiles': profiles_3d,
-                'clusters': clusters,
-                'profiles_matrix': profiles_matrix,
-                'stability_score': stability_score
-            }, f)
+        np.savez(
+            self.cache_file,
+            profiles=profiles_3d,
+            clusters=clusters,
+            profiles_matrix=profiles_matrix,
+            stability=np.array([stability_score])
+        )
+        self._save_sentence_cache()
         
         print(f"Profiling complete! Stability (ARI): {stability_score:.2f}")
     
-    def _extract_features(self, attention_matrix: np.ndarray) -> List[float]:
-        """Extract behavioral features from attention matrix"""
-        features = []
+    def _cluster(self, profiles_matrix: np.ndarray, random_state: int) -> np.ndarray:
+        """K-means cluster assignments for the 144 head profiles"""
+        # 144 points: a few k-means++ restarts are as stable as 10, and Elkan
+        # prunes distance computations in this few-samples/many-dims regime
+        kmeans = KMeans(n_clusters=5, random_state=random_state, n_init=3, algorithm='elkan')
+        return kmeans.fit_predict(profiles_matrix)
+    
+    def _compute_stability(self, profiles_matrix: np.ndarray, n_runs: int = 5) -> float:
+        """Mean adjusted Rand index between clusterings from different seeds"""
+        runs = [self._cluster(profiles_matrix, random_state=seed) for seed in range(n_runs)]
+        scores = [
+            adjusted_rand_score(runs[i], runs[j])
+            for i in range(n_runs) for j in range(i + 1, n_runs)
+        ]
+        return float(np.mean(scores))
+    
+    def _position_masks(self, seq_len: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distance matrix, strict upper-triangle mask) for a sequence length"""
+        if seq_len not in self._position_cache:
+            positions = np.arange(seq_len)
+            distances = np.abs(np.subtract.outer(positions, positions))
+            upper = np.triu(np.ones((seq_len, seq_len), dtype=bool), k=1)
+            self._position_cache[seq_len] = (distances, upper)
+        return self._position_cache[seq_len]
+    
+    def _sentence_features(self, sentence: str, attention: np.ndarray) -> np.ndarray:
+        """Feature grid (12 layers, 12 heads, 5) for one sentence's attention tensor"""
+        features = np.zeros((12, 12, 5))
+        try:
+            attention = attention[:12, :12]  # (layers, heads, seq, seq)
+            layers, heads = attention.shape[:2]
+            features[:layers, :heads] = self._extract_features(attention)
+        except Exception as e:
+            print(f"Error processing sentence '{sentence}': {e}")  # Fallback: zeros
+        return features
+    
+    def _extract_features(self, attention_matrix: np.ndarray) -> np.ndarray:
+        """
+        Extract behavioral features from attention matrices.
+        Accepts a (seq, seq) matrix or any stack (..., seq, seq) of them
+        and returns the 5 features along a new trailing axis: (..., 5).
+        """
+        seq_len = attention_matrix.shape[-1]
+        if NUMBA_AVAILABLE:
+            # float32 input: numba has no float16 arithmetic (cached attention is fp16)
+            stack = np.ascontiguousarray(attention_matrix, dtype=np.float32).reshape(-1, seq_len, seq_len)
+            return _feature_kernel(stack).reshape(attention_matrix.shape[:-2] + (5,))
+        
+        size = seq_len * seq_len
+        distances, upper = self._position_masks(seq_len)
         
         # 1. Diagonal attention (self-attention strength)
-        diag = np.diag(attention_matrix)
-        features.append(float(np.mean(diag)))
+        diag = np.trace(attention_matrix, axis1=-2, axis2=-1) / seq_len
         
         # 2. Forward attention (attending to future tokens)
-        upper_tri = np.triu(attention_matrix, k=1)
-        features.append(float(np.mean(upper_tri)))
+        forward = attention_matrix[..., upper].sum(axis=-1) / size
         
         # 3. Backward attention (attending to past tokens)
-        lower_tri = np.tril(attention_matrix, k=-1)
-        features.append(float(np.mean(lower_tri)))
-        
-        # 4. Attention spread (entropy)
-        # Avoid log(0) by adding small epsilon
-        entropy_per_row = -np.sum(
-            attention_matrix * np.log(attention_matrix + 1e-10), 
-            axis=1
-        )
-        features.append(float(np.mean(entropy_per_row)))
+        backward = attention_matrix[..., upper.T].sum(axis=-1) / size
+        
+        # 4. Attention spread (entropy); xlogy treats 0*log(0) as 0
+        entropy = -xlogy(attention_matrix, attention_matrix).sum(axis=-1).mean(axis=-1)
         
         # 5. Positional bias (attend to nearby vs distant tokens)
-        seq_len = len(attention_matrix)
-        weighted_distances = []
-        for i in range(seq_len):
-            for j in range(seq_len):
-                distance = abs(i - j)
-                weighted_distances.append(distance * attention_matrix[i, j])
-        features.append(float(np.mean(weighted_distances)))
+        positional = (attention_matrix * distances).sum(axis=(-2, -1)) / size
         
-        return features
+        return np.stack([diag, forward, backward, entropy, positional], axis=-1)
     
     def get_visualization_data(self) -> List[Dict]:
         """Return data for 3D scatter plot"""
-        if self.profiles is None:
+        if self.stability_score is None:
             self.compute_profiles()
         
-        points = []
-        for head_idx in range(144):
-            layer = head_idx // 12
-            head = head_idx % 12
-            
-            points.append({
-                'x': float(self.profiles[head_idx, 0]),
-                'y': float(self.profiles[head_idx, 1]),
-                'z': float(self.profiles[head_idx, 2]),
-                'layer': layer,
-                'head': head,
-                'cluster': int(self.clusters[head_idx]),
-                'label': self.cluster_labels[self.clusters[head_idx]],
-                'name': f"L{layer}H{head}"
-            })
+        # .tolist() converts each column to Python scalars in one C pass
+        xs, ys, zs = self.profiles.T.tolist()
+        return [
+            {'x': x, 'y': y, 'z': z, 'layer': l, 'head': h, 'cluster': c,
+             'label': self.cluster_labels[c], 'name': n}
+            for x, y, z, l, h, c, n in zip(
+                xs, ys, zs, self._layers_arr.tolist(), self._heads_arr.tolist(),
+                self.clusters.tolist(), self._names
+            )
+        ]
+    
+    def _save_sentence_cache(self):
+        """Persist per-sentence tokens, attention and features, padded to a common length"""
+        if not self._sentence_cache:
+            return
+        
+        sentences = list(self._sentence_cache)
+        lengths = [len(tokens) for tokens, _ in self._sentence_cache.values()]
+        max_len = max(lengths)
+        layers, heads = next(iter(self._sentence_cache.values()))[1].shape[:2]
+        
+        tokens = np.full((len(sentences), max_len), '', dtype=object)
+        attention = np.zeros((len(sentences), layers, heads, max_len, max_len), dtype=np.float16)
+        features = np.full((len(sentences), 12, 12, 5), np.nan)  # NaN: not yet extracted
+        for i, (sentence, (sent_tokens, sent_attention)) in enumerate(self._sentence_cache.items()):
+            n = len(sent_tokens)
+            tokens[i, :n] = sent_tokens
+            attention[i, :, :, :n, :n] = sent_attention
+            if sentence in self._feature_cache:
+                features[i] = self._feature_cache[sentence]
+        
+        np.savez(
+            self.attention_cache_file,
+            sentences=np.array(sentences),
+            tokens=tokens.astype(str),
+            lengths=np.array(lengths),
+            attention=attention,
+            features=features
+        )
+    
+    def _load_sentence_cache(self):
+        """Load per-sentence tokens, attention and features saved by _save_sentence_cache"""
+        self._sentence_cache_loaded = True
+        if not os.path.exists(self.attention_cache_file):
+            return
+        
+        with np.load(self.attention_cache_file) as data:
+            # Files from older layouts (e.g. only profiles/clusters) are a cache miss
+            if not {'sentences', 'tokens', 'lengths', 'attention'} <= set(data.files):
+                print(f"Ignoring {self.attention_cache_file}: not a sentence cache")
+                return
+            # Without stored features, cached attention is still reused and features re-extracted
+            features_all = data['features'] if 'features' in data.files else None
+            for i, (sentence, tokens, n, attention) in enumerate(zip(
+                data['sentences'], data['tokens'], data['lengths'], data['attention']
+            )):
+                sentence = str(sentence)
+                self._sentence_cache.setdefault(sentence, (tokens[:n].tolist(), attention[:, :, :n, :n]))
+                if features_all is not None and not np.isnan(features_all[i]).any():
+                    self._feature_cache.setdefault(sentence, features_all[i])
+    
+    def _get_sentence_attention(self, sentence: str) -> Tuple[List[str], np.ndarray]:
+        """Cached (tokens, attention) for a sentence; runs the engine only on a miss"""
+        if not self._sentence_cache_loaded:
+            self._load_sentence_cache()
+        
+        if sentence not in self._sentence_cache:
+            data = self.engine.get_attention_data(sentence)
+            self._sentence_cache[sentence] = (data['tokens'], data['attention'].astype(np.float16))
         
-        return points
+        return self._sentence_cache[sentence]
     
     def get_head_examples(self, layer: int, head: int, limit: int = 3) -> List[Dict]:
         """Get example sentences showing what this specific head does"""
-        examples = []
-        
+        sentences, token_lists, head_attentions = [], [], []
         for sentence in self.test_sentences[:10]:  # Sample first 10 for speed
             try:
-                data = self.engine.get_attention_data(sentence)
-                tokens = data['tokens']
-                attention = data['attention'][layer, head]
-                
-                # Find strongest attention connection
-                max_idx = np.unravel_index(np.argmax(attention), attention.shape)
-                max_weight = attention[max_idx]
-                
-                if max_weight > 0.2:  # Threshold for "interesting"
-                    examples.append({
-                        'sentence': sentence,
-                        'tokens': tokens,
-                        'from_token': tokens[max_idx[0]] if max_idx[0] < len(tokens) else "",
-                        'to_token': tokens[max_idx[1]] if max_idx[1] < len(tokens) else "",
-                        'weight': float(max_weight),
-                        'from_pos': int(max_idx[0]),
-                        'to_pos': int(max_idx[1])
-                    })
+                tokens, attention = self._get_sentence_attention(sentence)
+                head_attentions.append(attention[layer, head])
+                sentences.append(sentence)
+                token_lists.append(tokens)
             except Exception as e:
                 continue
         
-        # Return top examples by weight
-        examples.sort(key=lambda x: x['weight'], reverse=True)
-        return examples[:limit]
+        if not head_attentions:
+            return []
+        
+        # Zero-pad to a common length (weights are >= 0, so maxima are unaffected)
+        max_len = max(a.shape[-1] for a in head_attentions)
+        stacked = np.zeros((len(head_attentions), max_len, max_len), dtype=np.float32)
+        for i, a in enumerate(head_attentions):
+            stacked[i, :a.shape[0], :a.shape[1]] = a
+        
+        # Strongest attention connection per sentence
+        flat = stacked.reshape(len(head_attentions), -1)
+        max_idx = flat.argmax(axis=1)
+        weights = flat[np.arange(len(flat)), max_idx]
+        
+        # Top examples by weight among the "interesting" ones
+        candidates = np.flatnonzero(weights > 0.2)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-weights[candidates], limit)[:limit]]
+        top = candidates[np.argsort(-weights[candidates], kind='stable')]
+        
+        examples = []
+        for i in top:
+            tokens = token_lists[i]
+            from_pos, to_pos = divmod(int(max_idx[i]), max_len)
+            examples.append({
+                'sentence': sentences[i],
+                'tokens': tokens,
+                'from_token': tokens[from_pos] if from_pos < len(tokens) else "",
+                'to_token': tokens[to_pos] if to_pos < len(tokens) else "",
+                'weight': float(weights[i]),
+                'from_pos': from_pos,
+                'to_pos': to_pos
+            })
+        return examples
     
     def get_cluster_info(self, cluster_id: int) -> Dict:
         """Get information about a specific cluster"""
-        if self.clusters is None:
+        if self.stability_score is None:
             self.compute_profiles()
         
         # Find all heads in this cluster
@@ -318,16 +507,14 @@ class AttentionHeadProfiler:
 
     def get_head_explanation(self, layer, head):
         """Get detailed explanation of why this head was classified"""
-        if self.profiles_matrix is None:
+        if self.stability_score is None:
             self.compute_profiles()
         head_idx = layer * 12 + head
         cluster_id = int(self.clusters[head_idx])
         head_features = self.profiles_matrix[head_idx]
         features_per_sentence = 5
-        avg_features = []
-        for i in range(features_per_sentence):
-            feat_values = head_features[i::features_per_sentence]
-            avg_features.append(float(np.mean(feat_values)))
+        # Layout is (sentences, features) interleaved; average over sentences
+        avg_features = head_features.reshape(-1, features_per_sentence).mean(axis=0).tolist()
         explanations = []
         if avg_features[0] > 0.3:
             explanations.append(f'{int(avg_features[0]*100)}% self-attention')
@@ -348,18 +535,15 @@ class AttentionHeadProfiler:
 
     def get_layer_distribution(self):
         """Get distribution of cluster types across layers"""
-        if self.clusters is None:
+        if self.stability_score is None:
             self.compute_profiles()
+        layer_clusters = np.asarray(self.clusters).reshape(12, 12).astype(np.int64)
+        counts = np.apply_along_axis(lambda row: np.bincount(row, minlength=5), 1, layer_clusters)  # (12 layers, 5 clusters)
         distribution = {}
         for layer in range(12):
-            layer_heads = range(layer * 12, (layer + 1) * 12)
-            layer_clusters = [int(self.clusters[h]) for h in layer_heads]
-            cluster_counts = {}
-            for cluster_id in range(5):
-                count = layer_clusters.count(cluster_id)
-                if count > 0:
-                    cluster_counts[self.cluster_labels[cluster_id]] = count
-            distribution[f'Layer {layer}'] = cluster_counts
+            distribution[f'Layer {layer}'] = {
+                self.cluster_labels[c]: int(counts[layer, c]) for c in range(5) if counts[layer, c] > 0
+            }
         return distribution
 
     def get_metadata(self):
@@ -0,0 +1,72 @@
+"""
+Shared LLM Client
+One pooled (HTTP/2 when available) connection to OpenRouter for every LLM call
+"""
+import os
+from typing import Dict, List, Optional
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 - enables httpx HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Bound by the app's startup hook; None outside the app
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def is_configured() -> bool:
+    """Whether LLM calls can be made at all (httpx installed and an API key set)"""
+    return httpx is not None and bool(os.getenv("OPENROUTER_API_KEY"))
+
+
+def new_client() -> "httpx.AsyncClient":
+    """Client with the OpenRouter base URL, auth and pool limits"""
+    return httpx.AsyncClient(
+        base_url=OPENROUTER_BASE_URL,
+        headers={"Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}"},
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_keepalive_connections=32),
+        timeout=httpx.Timeout(60.0, connect=10.0)
+    )
+
+
+async def startup():
+    """Open the shared client (called from the app's startup hook)"""
+    global _client
+    if is_configured() and _client is None:
+        _client = new_client()
+
+
+async def shutdown():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def chat(model: str, messages: List[Dict], client: Optional["httpx.AsyncClient"] = None, **kw) -> str:
+    """
+    Chat completion via OpenRouter; returns the first choice's message content.
+    Uses the shared client unless one is given; callers on another event loop
+    than the app's must pass their own.
+    """
+    body = {"model": model, "messages": messages, **kw}
+    if client is None:
+        client = _client
+    if client is not None:
+        response = await client.post("/chat/completions", json=body)
+    else:
+        # Outside the app (scripts, sync callers): one-off client on the current loop
+        async with new_client() as client:
+            response = await client.post("/chat/completions", json=body)
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
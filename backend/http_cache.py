@@ -0,0 +1,24 @@
+"""
+HTTP Cache Helpers
+ETag / 304 handling for idempotent GET endpoints
+"""
+import hashlib
+from fastapi import Request, Response
+
+CACHE_CONTROL = "max-age=300"
+
+
+def etag_response(request: Request, payload: bytes) -> Response:
+    """JSON response tagged with a content hash; 304 with no body if the client already has it"""
+    etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Weak comparison: W/"x" matches "x" (str.removeprefix needs Python 3.9)
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        tags |= {tag[2:] for tag in tags if tag.startswith("W/")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=payload, media_type="application/json", headers=headers)
@@ -0,0 +1,27 @@
+"""
+Lazy Singletons
+Thread-safe create-on-first-use for router dependencies
+"""
+import threading
+from functools import wraps
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def lazy_singleton(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Like lru_cache(maxsize=1) on a zero-argument factory, but concurrent first
+    calls (handlers run on a threadpool) build exactly one instance
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @wraps(factory)
+    def get() -> T:
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+    return get
@@ -3,27 +3,31 @@ FastAPI Main Application
 LLM Engineer Pro Backend
 """
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 import sys
 
-# Add parent directory to path to import from main project
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Routers import backend modules (llm_logic, models, ...) top-level; put the
+# backend directory on the path once, only when not launched from it
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
 
 # Load environment variables
 load_dotenv()
 
-# Force reload attention_profiler module to pick up code changes
-import importlib
-try:
+# Development only: reload attention_profiler to pick up code changes
+if os.getenv("DEV_RELOAD") == "1":
+    import importlib
     import attention_profiler
     importlib.reload(attention_profiler)
     print("✓ Reloaded attention_profiler module")
-except Exception as e:
-    print(f"Note: Could not reload attention_profiler: {e}")
 
 
+import clients
+
 # Import routers
 from routers import (
     tokenizer,
@@ -38,7 +42,8 @@ from routers import (
 app = FastAPI(
     title="LLM Internals Explorer API",
     description="Backend for visualizing transformer internals with real models",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -60,6 +65,18 @@ app.include_router(attention.router, prefix="/api/attention", tags=["Attention"]
 app.include_router(context.router, prefix="/api/context", tags=["Context Window"])
 
 
+@app.on_event("startup")
+async def open_clients():
+    """Bind the shared LLM HTTP client to the app's event loop"""
+    await clients.startup()
+
+
+@app.on_event("shutdown")
+async def close_clients():
+    """Close pooled LLM connections"""
+    await clients.shutdown()
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -182,12 +182,7 @@ class AttentionResponse(BaseModel):
 # CONTEXT WINDOW MODELS
 # ============================================================
 
-class RecallDataPoint(BaseModel):
-    tokens: int
-    position: str
-    depth_pct: float
-    recall: float
-
-
 class RecallCurveResponse(BaseModel):
-    data: List[RecallDataPoint]
+    tokens: List[int]
+    position: List[str]
+    recall_matrix: List[List[float]]  # one row per position, one column per token count
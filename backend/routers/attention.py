@@ -2,52 +2,82 @@
 Attention Router
 Analyzes attention patterns in transformers
 """
-from fastapi import APIRouter, HTTPException
-import sys
-import os
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi import APIRouter, HTTPException, Request, Response
+import orjson
+import threading
+from functools import lru_cache
 
+from http_cache import etag_response
+from lazy import lazy_singleton
 from llm_logic import RealTransformerEngine
 from models import AttentionRequest, AttentionResponse
 
 router = APIRouter()
 
-# Initialize transformer engine
-transformer_engine = RealTransformerEngine()
+@lazy_singleton
+def _engine() -> RealTransformerEngine:
+    """Transformer engine, created on first request"""
+    return RealTransformerEngine()
 
-# Initialize attention head profiler (lazy loading)
+# Initialize attention head profiler (lazy loading; retried if it failed)
 _profiler = None
+_profiler_lock = threading.Lock()
 
 def get_profiler():
     global _profiler
     if _profiler is None:
-        try:
-            from attention_profiler import AttentionHeadProfiler
-            _profiler = AttentionHeadProfiler(transformer_engine)
-        except Exception as e:
-            print(f"Failed to initialize profiler: {e}")
+        with _profiler_lock:
+            if _profiler is None:
+                try:
+                    from attention_profiler import AttentionHeadProfiler
+                    _profiler = AttentionHeadProfiler(_engine())
+                except Exception as e:
+                    print(f"Failed to initialize profiler: {e}")
     return _profiler
 
 
-@router.post("/analyze", response_model=AttentionResponse)
-async def analyze_attention(request: AttentionRequest):
+# Same options as the app's default ORJSONResponse (cluster_labels has int keys)
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+# Profiles are computed once per profiler, so these payloads never change after the
+# first request; keyed on the profiler instance
+@lru_cache(maxsize=1)
+def _head_profiles_payload(profiler) -> bytes:
+    return orjson.dumps({"points": profiler.get_visualization_data()}, option=_ORJSON_OPTIONS)
+
+
+@lru_cache(maxsize=1)
+def _layer_distribution_payload(profiler) -> bytes:
+    return orjson.dumps({"distribution": profiler.get_layer_distribution()}, option=_ORJSON_OPTIONS)
+
+
+@lru_cache(maxsize=1)
+def _metadata_payload(profiler) -> bytes:
+    return orjson.dumps(profiler.get_metadata(), option=_ORJSON_OPTIONS)
+
+
+# AttentionResponse documents the schema only; the ndarray is serialized by orjson
+# directly instead of being boxed into nested lists and validated by Pydantic
+@router.post("/analyze", responses={200: {"model": AttentionResponse}})
+def analyze_attention(request: AttentionRequest):
     """Get attention weights for text"""
     try:
         # Get attention weights
-        result = transformer_engine.get_attention_weights(request.text)
+        result = _engine().get_attention_weights(request.text)
         
         # Extract specific layer and head
         attention_matrix = result['attention'][request.layer][request.head]
         
-        # Convert to list of lists
-        matrix_list = attention_matrix.tolist()
-        
-        return AttentionResponse(
-            tokens=result['tokens'],
-            attention_matrix=matrix_list,
-            layer=request.layer,
-            head=request.head
+        payload = {
+            "tokens": result['tokens'],
+            "attention_matrix": attention_matrix,
+            "layer": request.layer,
+            "head": request.head
+        }
+        return Response(
+            content=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+            media_type="application/json"
         )
         
     except Exception as e:
@@ -55,22 +85,21 @@ async def analyze_attention(request: AttentionRequest):
 
 
 @router.get("/head-profiles")
-async def get_head_profiles():
+def get_head_profiles(request: Request):
     """Get 3D visualization of attention head personalities"""
     try:
         profiler = get_profiler()
         if profiler is None:
             raise HTTPException(status_code=500, detail="Profiler not available")
         
-        points = profiler.get_visualization_data()
-        return {"points": points}
+        return etag_response(request, _head_profiles_payload(profiler))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get head profiles: {str(e)}")
 
 
 @router.get("/head-examples/{layer}/{head}")
-async def get_head_examples(layer: int, head: int):
+def get_head_examples(layer: int, head: int):
     """Get example sentences for a specific head"""
     try:
         profiler = get_profiler()
@@ -85,7 +114,7 @@ async def get_head_examples(layer: int, head: int):
 
 
 @router.get("/cluster-info/{cluster_id}")
-async def get_cluster_info(cluster_id: int):
+def get_cluster_info(cluster_id: int):
     """Get information about a specific cluster"""
     try:
         profiler = get_profiler()
@@ -100,7 +129,7 @@ async def get_cluster_info(cluster_id: int):
 
 
 @router.get("/head-explanation/{layer}/{head}")
-async def get_head_explanation(layer: int, head: int):
+def get_head_explanation(layer: int, head: int):
     """Get detailed explanation of why this head was classified into its cluster"""
     try:
         profiler = get_profiler()
@@ -115,30 +144,28 @@ async def get_head_explanation(layer: int, head: int):
 
 
 @router.get("/layer-distribution")
-async def get_layer_distribution():
+def get_layer_distribution(request: Request):
     """Get distribution of cluster types across all 12 layers"""
     try:
         profiler = get_profiler()
         if profiler is None:
             raise HTTPException(status_code=500, detail="Profiler not available")
         
-        distribution = profiler.get_layer_distribution()
-        return {"distribution": distribution}
+        return etag_response(request, _layer_distribution_payload(profiler))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get distribution: {str(e)}")
 
 
 @router.get("/metadata")
-async def get_profiler_metadata():
+def get_profiler_metadata(request: Request):
     """Get profiler metadata including stability score and feature information"""
     try:
         profiler = get_profiler()
         if profiler is None:
             raise HTTPException(status_code=500, detail="Profiler not available")
         
-        metadata = profiler.get_metadata()
-        return metadata
+        return etag_response(request, _metadata_payload(profiler))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get metadata: {str(e)}")
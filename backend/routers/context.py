@@ -2,40 +2,47 @@
 Context Window Router
 Provides recall curve data for context window analysis
 """
-from fastapi import APIRouter, HTTPException, Query
-import sys
-import os
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi import APIRouter, HTTPException, Query, Request
+import numpy as np
+import orjson
+from functools import lru_cache
 
+from http_cache import etag_response
+from lazy import lazy_singleton
 from llm_logic import ContextTester
-from models import RecallCurveResponse, RecallDataPoint
+from models import RecallCurveResponse
 
 router = APIRouter()
 
-# Initialize context tester
-context_tester = ContextTester()
+@lazy_singleton
+def _context_tester() -> ContextTester:
+    """Context tester, created on first request"""
+    return ContextTester()
+
+
+# Row order of recall_matrix
+POSITIONS = ["middle", "start", "end"]
+
 
+@lru_cache(maxsize=32)
+def _recall_curve_payload(max_tokens: int) -> bytes:
+    """Serialized recall curve; a pure function of max_tokens"""
+    curve = _context_tester().calculate_recall_curve(max_tokens)
+    payload = {
+        "tokens": curve['tokens'],
+        "position": POSITIONS,
+        "recall_matrix": np.stack([curve['recall_mid'], curve['recall_edge'], curve['recall_edge']])
+    }
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
 
-@router.get("/recall-curve", response_model=RecallCurveResponse)
-async def get_recall_curve(max_tokens: int = Query(16000, ge=1000, le=32000)):
+
+# RecallCurveResponse documents the schema only; the columns are serialized by
+# orjson straight from NumPy instead of as one validated model per point
+@router.get("/recall-curve", responses={200: {"model": RecallCurveResponse}})
+def get_recall_curve(request: Request, max_tokens: int = Query(16000, ge=1000, le=32000)):
     """Get recall curve data for context window visualization"""
     try:
-        # Calculate recall curve
-        data = context_tester.calculate_recall_curve(max_tokens)
-        
-        # Convert to RecallDataPoint objects
-        data_points = [
-            RecallDataPoint(
-                tokens=row['tokens'],
-                position=row['position'],
-                depth_pct=row.get('depth_pct', 0),
-                recall=row['recall']
-            )
-            for row in data
-        ]
-        
-        return RecallCurveResponse(data=data_points)
+        return etag_response(request, _recall_curve_payload(max_tokens))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recall curve generation failed: {str(e)}")
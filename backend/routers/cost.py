@@ -2,30 +2,62 @@
 Cost Analysis Router
 Analyzes prompts and recommends optimal models
 """
-from fastapi import APIRouter, HTTPException
-import sys
-import os
+from fastapi import APIRouter, HTTPException, Request, Response
+import orjson
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from llm_logic import SmartRouter
-from models import (
-    CostAnalysisRequest, CostAnalysisResponse, ModelInfo,
-    Warning, BloatResult
-)
+from http_cache import etag_response
+from lazy import lazy_singleton
+from llm_logic import MODEL_CATALOG, SmartRouter, count_repeated_words
+from models import CostAnalysisRequest, CostAnalysisResponse
 
 router = APIRouter()
 
-# Initialize components
-smart_router = SmartRouter()
+@lazy_singleton
+def _smart_router() -> SmartRouter:
+    """Smart router, created on first request"""
+    return SmartRouter()
+
+
+# Slotted mirrors of the Pydantic response models; orjson serializes dataclasses
+# natively, so the response is built without per-field validation.
+# __slots__ is declared by hand: dataclass(slots=True) needs Python 3.10
+@dataclass
+class _ModelInfo:
+    __slots__ = ("name", "cost", "speed", "quality", "description")
+    name: str
+    cost: float
+    speed: float
+    quality: int
+    description: str
+
+
+@dataclass
+class _Warning:
+    __slots__ = ("type", "severity", "message", "suggestion")
+    type: str
+    severity: str
+    message: str
+    suggestion: str
+
 
+@dataclass
+class _BloatResult:
+    __slots__ = ("bloat_score", "repetition_score", "recommendations")
+    bloat_score: float
+    repetition_score: float
+    recommendations: List[str]
 
-@router.post("/analyze", response_model=CostAnalysisResponse)
-async def analyze_cost(request: CostAnalysisRequest):
+
+# CostAnalysisResponse documents the schema only
+@router.post("/analyze", responses={200: {"model": CostAnalysisResponse}})
+def analyze_cost(request: CostAnalysisRequest):
     """Analyze prompt and recommend optimal model"""
     try:
         # Use SmartRouter to analyze
-        analysis = smart_router.analyze_and_route(request.prompt)
+        analysis = _smart_router().analyze_and_route(request.prompt)
         
         # Simple quality scoring based on prompt length and structure
         quality_score = 85  # Default
@@ -33,7 +65,7 @@ async def analyze_cost(request: CostAnalysisRequest):
         
         # Check for common issues
         if len(request.prompt) < 10:
-            warnings.append(Warning(
+            warnings.append(_Warning(
                 type="brevity",
                 severity="medium",
                 message="Prompt is very short",
@@ -42,7 +74,7 @@ async def analyze_cost(request: CostAnalysisRequest):
             quality_score -= 10
         
         if len(request.prompt) > 2000:
-            warnings.append(Warning(
+            warnings.append(_Warning(
                 type="verbosity",
                 severity="low",
                 message="Prompt is quite long",
@@ -50,9 +82,8 @@ async def analyze_cost(request: CostAnalysisRequest):
             ))
         
         # Simple bloat detection
-        words = request.prompt.lower().split()
-        unique_words = set(words)
-        repetition_score = (len(words) - len(unique_words)) / max(len(words), 1) * 100
+        n_words, n_repeats = count_repeated_words(request.prompt)
+        repetition_score = n_repeats / max(n_words, 1) * 100
         bloat_score = min(100, repetition_score * 2)
         
         bloat_recommendations = []
@@ -64,8 +95,8 @@ async def analyze_cost(request: CostAnalysisRequest):
         # Get recommended model info
         recommended_info = analysis['cost_analysis'][0]
         
-        # Convert to ModelInfo
-        recommended = ModelInfo(
+        # Convert to _ModelInfo
+        recommended = _ModelInfo(
             name=analysis['recommended_model'],
             cost=recommended_info['total_cost'],
             speed=recommended_info['latency'],
@@ -75,7 +106,7 @@ async def analyze_cost(request: CostAnalysisRequest):
         
         # Convert all models
         all_models = [
-            ModelInfo(
+            _ModelInfo(
                 name=m['model'],
                 cost=m['total_cost'],
                 speed=m['latency'],
@@ -86,47 +117,51 @@ async def analyze_cost(request: CostAnalysisRequest):
         ]
         
         # Create bloat result
-        bloat_analysis = BloatResult(
+        bloat_analysis = _BloatResult(
             bloat_score=int(bloat_score),
             repetition_score=int(repetition_score),
             recommendations=bloat_recommendations if bloat_recommendations else ["Prompt looks good"]
         )
         
-        return CostAnalysisResponse(
-            recommended=recommended,
-            all_models=all_models,
-            quality_warnings=warnings,
-            bloat_analysis=bloat_analysis,
-            cost_breakdown={
+        payload = {
+            "recommended": recommended,
+            "all_models": all_models,
+            "quality_warnings": warnings,
+            "bloat_analysis": bloat_analysis,
+            "cost_breakdown": {
                 "input_tokens": recommended_info['input_tokens'],
                 "output_tokens": recommended_info['est_output_tokens'],
                 "total_cost": recommended_info['total_cost']
             }
-        )
+        }
+        return Response(content=orjson.dumps(payload), media_type="application/json")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Cost analysis failed: {str(e)}")
 
 
+@lru_cache(maxsize=1)
+def _models_payload() -> bytes:
+    """Serialized model catalog; static for the life of the process"""
+    models = []
+    for key, model in MODEL_CATALOG.items():
+        models.append({
+            "name": key,
+            "full_name": model.model_id,
+            "input_cost": model.input_cost,
+            "output_cost": model.output_cost,
+            "context_window": model.context_window,
+            "speed_tier": model.speed_tier,
+            "latency": model.avg_latency
+        })
+    return orjson.dumps({"models": models})
+
+
 @router.get("/models")
-async def get_models():
+def get_models(request: Request):
     """Get all available models with pricing"""
     try:
-        from llm_logic import MODEL_CATALOG
-        
-        models = []
-        for key, model in MODEL_CATALOG.items():
-            models.append({
-                "name": key,
-                "full_name": model.name,
-                "input_cost": model.input_cost_per_1k,
-                "output_cost": model.output_cost_per_1k,
-                "context_window": model.context_window,
-                "speed_tier": model.speed_tier,
-                "latency": model.latency
-            })
-        
-        return {"models": models}
+        return etag_response(request, _models_payload())
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
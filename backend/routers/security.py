@@ -3,18 +3,17 @@ Security Router
 Analyzes prompts for security risks
 """
 from fastapi import APIRouter, HTTPException
-import sys
-import os
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from lazy import lazy_singleton
 from llm_logic import AgnoSecurityAnalyzer
 from models import SecurityAnalysisRequest, SecurityAnalysisResponse, SecurityFlag
 
 router = APIRouter()
 
-# Initialize security analyzer
-sec_analyzer = AgnoSecurityAnalyzer()
+@lazy_singleton
+def _analyzer() -> AgnoSecurityAnalyzer:
+    """Security analyzer, created on first request"""
+    return AgnoSecurityAnalyzer()
 
 
 @router.post("/analyze", response_model=SecurityAnalysisResponse)
@@ -22,7 +21,7 @@ async def analyze_security(request: SecurityAnalysisRequest):
     """Analyze prompt for security risks"""
     try:
         # Analyze risk
-        result = sec_analyzer.analyze_risk(request.prompt)
+        result = await _analyzer().analyze_risk_async(request.prompt)
         
         # Convert flags to SecurityFlag objects
         flags = [
@@ -2,35 +2,31 @@
 Tokenizer Router
 Tokenizes text using the existing TokenCounter logic
 """
-from fastapi import APIRouter, HTTPException
-import sys
-import os
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi import APIRouter, HTTPException, Response
+import orjson
 
+from lazy import lazy_singleton
 from llm_logic import TokenCounter
-from models import TokenizeRequest, TokenizeResponse, Token
+from models import TokenizeRequest, TokenizeResponse
 
 router = APIRouter()
 
-# Initialize token counter
-token_counter = TokenCounter()
+@lazy_singleton
+def _token_counter() -> TokenCounter:
+    """Token counter, created on first request"""
+    return TokenCounter()
 
 
-@router.post("/tokenize", response_model=TokenizeResponse)
-async def tokenize_text(request: TokenizeRequest):
+# TokenizeResponse documents the schema only; plain dicts are serialized by orjson
+# directly instead of building and validating one Token model per token
+@router.post("/tokenize", responses={200: {"model": TokenizeResponse}})
+def tokenize_text(request: TokenizeRequest):
     """Tokenize input text and return tokens with IDs"""
     try:
-        # Get token IDs
-        token_ids = token_counter.get_token_ids(request.text)
-        
-        # Decode tokens
-        decoded_tokens = token_counter.decode_tokens(token_ids)
-        
-        # Create token objects
+        # Token IDs and their strings from one encode, zipped straight into entries
         tokens = [
-            Token(text=text, id=tid)
-            for tid, text in zip(token_ids, decoded_tokens)
+            {"text": text, "id": tid}
+            for tid, text in zip(*_token_counter().tokenize(request.text))
         ]
         
         # Calculate stats
@@ -40,7 +36,10 @@ async def tokenize_text(request: TokenizeRequest):
             "compressionRatio": round(len(request.text) / max(len(tokens), 1), 2)
         }
         
-        return TokenizeResponse(tokens=tokens, stats=stats)
+        return Response(
+            content=orjson.dumps({"tokens": tokens, "stats": stats}),
+            media_type="application/json"
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Tokenization failed: {str(e)}")
@@ -0,0 +1,37 @@
+import numpy as np
+
+from attention_profiler import AttentionHeadProfiler
+
+
+def _profiler(cache_file):
+    profiler = AttentionHeadProfiler(transformer_engine=None)
+    profiler.attention_cache_file = str(cache_file)
+    return profiler
+
+
+def test_old_layout_attention_cache_is_a_miss(tmp_path):
+    cache_file = tmp_path / "attention_cache.npz"
+    np.savez(cache_file, profiles=np.zeros((144, 3)), clusters=np.zeros(144))
+
+    profiler = _profiler(cache_file)
+    profiler._load_sentence_cache()
+    assert profiler._sentence_cache == {}
+    assert profiler._feature_cache == {}
+
+
+def test_sentence_cache_round_trip(tmp_path):
+    cache_file = tmp_path / "attention_cache.npz"
+    attention = np.full((12, 12, 2, 2), 0.5, dtype=np.float16)
+    features = np.ones((12, 12, 5))
+
+    writer = _profiler(cache_file)
+    writer._sentence_cache["Hi there"] = (["Hi", " there"], attention)
+    writer._feature_cache["Hi there"] = features
+    writer._save_sentence_cache()
+
+    reader = _profiler(cache_file)
+    reader._load_sentence_cache()
+    tokens, cached_attention = reader._sentence_cache["Hi there"]
+    assert tokens == ["Hi", " there"]
+    np.testing.assert_array_equal(cached_attention, attention)
+    np.testing.assert_array_equal(reader._feature_cache["Hi there"], features)
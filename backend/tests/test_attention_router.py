@@ -0,0 +1,44 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from attention_profiler import AttentionHeadProfiler
+from main import app
+from routers import attention
+
+
+def _profiler():
+    """Profiler with precomputed results, so no model is needed"""
+    profiler = AttentionHeadProfiler(transformer_engine=None)
+    profiler.profiles = np.zeros((144, 3))
+    profiler.clusters = np.arange(144) % 5
+    profiler.stability_score = 0.8
+    return profiler
+
+
+def test_metadata_endpoint(monkeypatch):
+    profiler = _profiler()
+    monkeypatch.setattr(attention, "get_profiler", lambda: profiler)
+    attention._metadata_payload.cache_clear()
+    client = TestClient(app)
+
+    response = client.get("/api/attention/metadata")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["num_heads"] == 144
+    assert body["stability_score"] == 0.8
+    assert body["cluster_labels"]["0"] == "Syntax Trackers"
+
+    # Revalidation with the returned ETag is answered without a body
+    cached = client.get("/api/attention/metadata", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_weak_etag_revalidates(monkeypatch):
+    profiler = _profiler()
+    monkeypatch.setattr(attention, "get_profiler", lambda: profiler)
+    client = TestClient(app)
+
+    etag = client.get("/api/attention/layer-distribution").headers["etag"]
+    cached = client.get("/api/attention/layer-distribution", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert cached.status_code == 304
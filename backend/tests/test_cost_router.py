@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+
+from main import app
+from routers.cost import _ModelInfo
+
+
+def test_response_dataclasses_are_slotted():
+    info = _ModelInfo(name="m", cost=0.1, speed=0.2, quality=85, description="d")
+    assert not hasattr(info, "__dict__")
+
+
+def test_analyze_cost_endpoint():
+    response = TestClient(app).post("/api/cost/analyze", json={"prompt": "Write a function to sort a list"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["recommended"]["name"] in {m["name"] for m in body["all_models"]}
+    assert len(body["all_models"]) == 5
+    assert set(body["bloat_analysis"]) == {"bloat_score", "repetition_score", "recommendations"}
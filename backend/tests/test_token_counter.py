@@ -0,0 +1,25 @@
+from llm_logic import TokenCounter
+
+
+class _ByteEncoder:
+    """tiktoken-like encoder (one token per byte) that rejects special tokens in encode()"""
+    def encode(self, text):
+        if "<|endoftext|>" in text:
+            raise ValueError("disallowed special token")
+        return self.encode_ordinary(text)
+
+    def encode_ordinary(self, text):
+        return list(text.encode())
+
+    def decode_tokens_bytes(self, ids):
+        return [bytes([i]) for i in ids]
+
+
+def test_special_token_text_is_handled_alike_by_every_method():
+    counter = TokenCounter()
+    counter.encoders = {"gpt4": _ByteEncoder()}
+    text = "end <|endoftext|>"
+
+    ids, texts = counter.tokenize(text)
+    assert counter.count(text) == len(ids) == len(counter.get_token_ids(text)) == len(text)
+    assert "".join(texts) == text
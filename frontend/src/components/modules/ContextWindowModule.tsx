@@ -13,14 +13,12 @@ export function ContextWindowModule() {
     queryFn: () => contextApi.getRecallCurve(maxTokens),
   });
 
-  const recallData = data?.data || [];
-
-  // Group by position for visualization
+  // Average each position's row of the columnar recall matrix
   const positions = ['start', 'middle', 'end'];
   const positionData = positions.map(pos => {
-    const items = recallData.filter((d: any) => d.position === pos);
-    const avgRecall = items.length > 0
-      ? items.reduce((sum: number, d: any) => sum + d.recall, 0) / items.length
+    const row = data?.recall_matrix[data.position.indexOf(pos)] || [];
+    const avgRecall = row.length > 0
+      ? row.reduce((sum, recall) => sum + recall, 0) / row.length
       : 0;
     return { position: pos, recall: avgRecall };
   });
@@ -136,9 +136,16 @@ export const attentionApi = {
 // CONTEXT WINDOW API
 // ============================================================
 
+// Columnar curve: recall_matrix[i][j] is the recall at position[i] for tokens[j]
+export interface RecallCurve {
+    tokens: number[];
+    position: string[];
+    recall_matrix: number[][];
+}
+
 export const contextApi = {
     getRecallCurve: (maxTokens: number = 16000) =>
-        apiClient.get(`/api/context/recall-curve?max_tokens=${maxTokens}`),
+        apiClient.get<RecallCurve, RecallCurve>(`/api/context/recall-curve?max_tokens=${maxTokens}`),
 };
 
 // Export default client